@@ -1,10 +1,71 @@
+import asyncio
+import hashlib
+import json
+import re
+import weakref
+from collections import OrderedDict
+
 import anthropic
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+
+# Per event loop: (clients by credential set, generator that closes them)
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_client(
+    api_key: str, base_url: str, auth_token: str
+) -> anthropic.AsyncAnthropic:
+    """
+    Return the running loop's shared client for a credential set.
+
+    The connection pool is reused within a loop, but pooled keep-alive
+    connections are bound to the loop that opened them, so each separate
+    asyncio.run(...) gets its own clients. They are closed on their loop as it
+    shuts down, which also drops the loop's entry.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _loop_clients.get(loop)
+    if entry is None:
+        clients: Dict[tuple, anthropic.AsyncAnthropic] = {}
+        closer = _close_on_loop_shutdown(loop, clients)
+        # The entry holds the closer; the loop itself only tracks it weakly
+        entry = _loop_clients[loop] = (clients, closer)
+        asyncio.ensure_future(anext(closer))
+
+    clients = entry[0]
+    key = (api_key, base_url, auth_token)
+    if key not in clients:
+        clients[key] = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            base_url=base_url or None,
+            auth_token=auth_token or None,
+        )
+    return clients[key]
+
+
+async def _close_on_loop_shutdown(loop: asyncio.AbstractEventLoop, clients: Dict):
+    """
+    Park until the loop finalizes its async generators, then close its clients.
+
+    asyncio.run(...) finalizes async generators while the loop still runs, so
+    the pooled connections close on the loop that opened them.
+    """
+    try:
+        yield
+    finally:
+        _loop_clients.pop(loop, None)
+        for client in clients.values():
+            await client.close()
 
 
 class AIGenerator:
     """Handles interactions with Anthropic's Claude API for generating responses"""
 
+    # Instances carry only these attributes; everything else is class-level
+    __slots__ = ("_credentials", "model", "base_params", "_response_cache")
+
     MAX_TOOL_ROUNDS = 2
 
     # Static system prompt to avoid rebuilding on each call
@@ -33,89 +94,306 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
 
+    # Cached system prompt block, sent as the first entry of every system list
+    SYSTEM_BLOCK = {
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    }
+
+    # Shared tool_choice sent by reference with every tool-enabled call
+    TOOL_CHOICE_AUTO = {"type": "auto"}
+
+    # Seconds between status checks while a message batch is processing
+    BATCH_POLL_INTERVAL = 5.0
+
+    # Estimated-token cap on conversation history sent with each query
+    HISTORY_TOKEN_BUDGET = 2000
+
+    # Boundary before each "Role: content" message in SessionManager's history;
+    # assistant answers are multi-line, so plain newlines are not boundaries
+    HISTORY_MESSAGE_BOUNDARY = re.compile(r"\n(?=(?:User|Assistant): )")
+
+    # Max direct (no tool use) answers kept for repeated queries
+    RESPONSE_CACHE_SIZE = 512
+
+    # Returned instead of a synthesis call when every search came back empty
+    NO_RESULTS_RESPONSE = "I couldn't find relevant course material for that query."
+
     def __init__(self, api_key: str, base_url: str, auth_token: str, model: str):
-        self.client = anthropic.Anthropic(
-            api_key=api_key,
-            base_url=base_url or None,
-            auth_token=auth_token or None,
-        )
+        # The client is resolved per event loop on use — see the client property
+        self._credentials = (api_key, base_url, auth_token)
         self.model = model
 
         # Pre-build base API parameters
         self.base_params = {"model": self.model, "temperature": 0, "max_tokens": 800}
 
-    def generate_response(
+        # LRU of direct answers keyed by (query, history hash, tool names)
+        self._response_cache: OrderedDict[tuple, str] = OrderedDict()
+
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        """Shared client for the running event loop; only valid inside a coroutine"""
+        return _get_client(*self._credentials)
+
+    async def generate_response(
         self,
         query: str,
         conversation_history: Optional[str] = None,
         tools: Optional[List] = None,
         tool_manager=None,
+        sources: Optional[List[Dict[str, Any]]] = None,
     ) -> str:
         """
         Generate AI response with optional tool usage and conversation context.
 
+        Complete direct answers (stop_reason "end_turn", no tool use) are kept
+        in the response cache; this is the only method that reads or fills it.
+
         Args:
             query: The user's question or request
             conversation_history: Previous messages for context
             tools: Available tools the AI can use
             tool_manager: Manager to execute tools
+            sources: Per-query list the executed tools append their sources to
 
         Returns:
             Generated response as string
         """
+        cache_key = self._response_cache_key(query, conversation_history, tools)
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self._response_cache.move_to_end(cache_key)
+            return cached
 
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else self.SYSTEM_PROMPT
-        )
+        api_params = self._build_params(query, conversation_history, tools)
+
+        # Get response from Claude
+        response = await self.client.messages.create(**api_params)
+
+        # Handle tool execution if needed — tool output is not cached
+        if response.stop_reason == "tool_use":
+            if tool_manager:
+                return await self._handle_tool_execution(
+                    response, api_params, tool_manager, sources
+                )
+            return response.content[0].text
+
+        # Cache only complete direct answers — a max_tokens reply is truncated
+        answer = response.content[0].text
+        if response.stop_reason == "end_turn":
+            self._response_cache[cache_key] = answer
+            if len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+        return answer
+
+    def clear_response_cache(self):
+        """Forget cached answers, e.g. after the course corpus changes"""
+        self._response_cache.clear()
+
+    async def generate_responses_batch(
+        self,
+        queries: List[str],
+        conversation_history: Optional[str] = None,
+        tools: Optional[List] = None,
+        tool_manager=None,
+        poll_interval: Optional[float] = None,
+    ) -> List[str]:
+        """
+        Generate responses for many queries through the Message Batches API.
+
+        Meant for bulk/offline work such as evaluation runs, where batch pricing
+        and throughput matter more than latency. Batches cannot run the
+        multi-round tool loop, so a query whose batched reply asks for a tool
+        continues interactively from that reply, and a query whose batch entry
+        did not succeed is re-run interactively. Batched answers bypass the
+        response cache; only the interactive re-runs go through it.
 
-        # Prepare API call parameters efficiently
-        api_params = {
-            **self.base_params,
-            "messages": [{"role": "user", "content": query}],
-            "system": system_content,
+        Args:
+            queries: The questions to answer
+            conversation_history: Previous messages shared by every query
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            poll_interval: Seconds between batch status checks
+
+        Returns:
+            Response strings in the same order as queries
+        """
+        if not queries:
+            return []
+        if poll_interval is None:
+            poll_interval = self.BATCH_POLL_INTERVAL
+
+        params_by_id = {
+            f"query-{i}": self._build_params(query, conversation_history, tools)
+            for i, query in enumerate(queries)
         }
+        batch = await self.client.messages.batches.create(
+            requests=[
+                {"custom_id": custom_id, "params": params}
+                for custom_id, params in params_by_id.items()
+            ]
+        )
+        while batch.processing_status != "ended":
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.messages.batches.retrieve(batch.id)
+
+        answers: Dict[str, str] = {}
+        async for entry in await self.client.messages.batches.results(batch.id):
+            if entry.result.type != "succeeded":
+                continue
+            message = entry.result.message
+            if message.stop_reason == "tool_use" and tool_manager:
+                answers[entry.custom_id] = await self._handle_tool_execution(
+                    message, params_by_id[entry.custom_id], tool_manager
+                )
+            else:
+                answers[entry.custom_id] = message.content[0].text
+
+        for custom_id, query in zip(params_by_id, queries):
+            if custom_id not in answers:
+                answers[custom_id] = await self.generate_response(
+                    query, conversation_history, tools, tool_manager
+                )
+
+        return [answers[custom_id] for custom_id in params_by_id]
+
+    def _build_params(
+        self, query: str, conversation_history: Optional[str], tools: Optional[List]
+    ) -> Dict[str, Any]:
+        """Build the API parameters for the first call of a query."""
+        # Static prompt block carries the cache breakpoint; history goes in a
+        # separate uncached block so the cached prefix stays identical per call
+        system_content = [self.SYSTEM_BLOCK]
+        if conversation_history:
+            history = self._fit_history(conversation_history)
+            system_content.append(
+                {"type": "text", "text": f"Previous conversation:\n{history}"}
+            )
+
+        # Prepare API call parameters efficiently — dict.copy() skips the
+        # per-key rehashing a {**base_params} splat does
+        api_params = self.base_params.copy()
+        api_params["messages"] = [{"role": "user", "content": query}]
+        api_params["system"] = system_content
 
         # Add tools if available
         if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
+            api_params["tools"] = self._with_cache_breakpoint(tools)
+            api_params["tool_choice"] = self.TOOL_CHOICE_AUTO
 
-        # Get response from Claude
-        response = self.client.messages.create(**api_params)
-
-        # Handle tool execution if needed
-        if response.stop_reason == "tool_use" and tool_manager:
-            return self._handle_tool_execution(response, api_params, tool_manager)
-
-        # Return direct response
-        return response.content[0].text
-
-    def _run_tool_round(self, response, messages: List, tool_manager) -> List:
-        """Execute all tool calls in response and append results to messages."""
-        tool_results = []
-        for content_block in response.content:
-            if content_block.type == "tool_use":
-                tool_result = tool_manager.execute_tool(
-                    content_block.name, **content_block.input
-                )
-                tool_results.append(
-                    {
-                        "type": "tool_result",
-                        "tool_use_id": content_block.id,
-                        "content": tool_result,
-                    }
+        return api_params
+
+    @staticmethod
+    def _response_cache_key(
+        query: str, conversation_history: Optional[str], tools: Optional[List]
+    ) -> tuple:
+        """Build the response-cache key for a query with its context."""
+        history_hash = (
+            hashlib.blake2b(conversation_history.encode(), digest_size=8).hexdigest()
+            if conversation_history
+            else None
+        )
+        tools_key = tuple(tool["name"] for tool in tools or ())
+        return " ".join(query.lower().split()), history_hash, tools_key
+
+    @classmethod
+    def _fit_history(cls, history: str, budget_tokens: Optional[int] = None) -> str:
+        """
+        Drop the oldest whole messages until the rest fits the token budget.
+
+        Tokens are estimated at ~4 characters each, which is close enough for
+        mostly-English text and needs no tokenizer.
+        """
+        if budget_tokens is None:
+            budget_tokens = cls.HISTORY_TOKEN_BUDGET
+        budget_chars = budget_tokens * 4
+        if len(history) <= budget_chars:
+            return history
+
+        messages = cls.HISTORY_MESSAGE_BOUNDARY.split(history)
+        kept = []
+        used = 0
+        for message in reversed(messages):
+            used += len(message) + 1
+            if used > budget_chars:
+                break
+            kept.append(message)
+        kept.reverse()
+
+        omitted = len(messages) - len(kept)
+        return "\n".join([f"[earlier turns omitted: {omitted}]", *kept])
+
+    @staticmethod
+    def _with_cache_breakpoint(tools: List) -> List:
+        """Return tools with a cache_control marker on the last definition."""
+        return [*tools[:-1], {**tools[-1], "cache_control": {"type": "ephemeral"}}]
+
+    async def _run_tool_round(
+        self,
+        response,
+        messages: List,
+        tool_manager,
+        tool_cache: Dict[tuple, str],
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[List, bool]:
+        """
+        Execute all tool calls in response and append results to messages.
+
+        Returns the updated messages and whether any tool_use block was run.
+        Results are memoized in tool_cache by (name, input) so a call Claude
+        repeats within the same query is answered without re-running the tool.
+        Each call collects its sources separately; they are added to sources in
+        block order.
+        """
+        tool_uses = [block for block in response.content if block.type == "tool_use"]
+        # JSON rather than a tuple of items so list- or dict-valued inputs hash too
+        keys = [
+            (block.name, json.dumps(block.input, sort_keys=True)) for block in tool_uses
+        ]
+
+        # Tools do blocking vector-store I/O — run them in worker threads so the
+        # event loop stays free and independent calls overlap
+        pending = {}
+        call_sources = {}
+        for key, block in zip(keys, tool_uses):
+            if key not in tool_cache and key not in pending:
+                call_sources[key] = []
+                pending[key] = asyncio.to_thread(
+                    tool_manager.execute_tool,
+                    block.name,
+                    sources=call_sources[key],
+                    **block.input,
                 )
+        if len(pending) > 1:
+            tool_cache.update(zip(pending, await asyncio.gather(*pending.values())))
+        else:
+            for key, call in pending.items():
+                tool_cache[key] = await call
+
+        # Merge in block order, whichever worker thread finished first
+        if sources is not None:
+            for found in call_sources.values():
+                sources.extend(found)
+
+        outputs = [tool_cache[key] for key in keys]
+
+        tool_results = [
+            {"type": "tool_result", "tool_use_id": block.id, "content": output}
+            for block, output in zip(tool_uses, outputs)
+        ]
 
         if tool_results:
             messages.append({"role": "user", "content": tool_results})
 
-        return messages
+        return messages, bool(tool_results)
 
-    def _handle_tool_execution(
-        self, initial_response, base_params: Dict[str, Any], tool_manager
+    async def _handle_tool_execution(
+        self,
+        initial_response,
+        base_params: Dict[str, Any],
+        tool_manager,
+        sources: Optional[List[Dict[str, Any]]] = None,
     ):
         """
         Handle execution of tool calls and get follow-up response.
@@ -126,28 +404,42 @@ Provide only the direct answer to what was asked.
             initial_response: The response containing tool use requests
             base_params: Base API parameters
             tool_manager: Manager to execute tools
+            sources: Per-query list the executed tools append their sources to
 
         Returns:
             Final response text after tool execution
         """
-        messages = base_params["messages"].copy()
-        messages.append({"role": "assistant", "content": initial_response.content})
+        # base_params carries just the user turn; build the list in one go
+        # rather than copying it and appending
+        (user_message,) = base_params["messages"]
+        messages = [
+            user_message,
+            {"role": "assistant", "content": initial_response.content},
+        ]
         current_response = initial_response
+        tool_cache: Dict[tuple, str] = {}
+
+        # Everything but messages is invariant across rounds — build it once
+        round_params = self.base_params.copy()
+        round_params["system"] = base_params["system"]
+        round_params["tools"] = base_params["tools"]
+        round_params["tool_choice"] = self.TOOL_CHOICE_AUTO
 
         for round_num in range(self.MAX_TOOL_ROUNDS):
-            messages = self._run_tool_round(current_response, messages, tool_manager)
+            messages, had_tool_use = await self._run_tool_round(
+                current_response, messages, tool_manager, tool_cache, sources
+            )
+
+            # Nothing was executed, so there are no results for Claude to read —
+            # the response already holds the answer
+            if not had_tool_use:
+                return current_response.content[0].text
 
             if round_num < self.MAX_TOOL_ROUNDS - 1:
                 # Not the last round — offer tools again so Claude can chain
-                intermediate_params = {
-                    **self.base_params,
-                    "messages": messages,
-                    "system": base_params["system"],
-                    "tools": base_params["tools"],
-                    "tool_choice": {"type": "auto"},
-                }
-                intermediate_response = self.client.messages.create(
-                    **intermediate_params
+                round_params["messages"] = messages
+                intermediate_response = await self.client.messages.create(
+                    **round_params
                 )
 
                 if intermediate_response.stop_reason != "tool_use":
@@ -159,10 +451,14 @@ Provide only the direct answer to what was asked.
                 )
                 current_response = intermediate_response
 
-        # Max rounds reached — synthesize without tools
-        final_params = {
-            **self.base_params,
-            "messages": messages,
-            "system": base_params["system"],
-        }
-        return self.client.messages.create(**final_params).content[0].text
+        # Every tool result was a miss — synthesis would only restate that
+        if all(tool_manager.is_empty_result(result) for result in tool_cache.values()):
+            return self.NO_RESULTS_RESPONSE
+
+        # Max rounds reached — synthesize without tools from every result verbatim
+        final_params = self.base_params.copy()
+        final_params["messages"] = messages
+        final_params["system"] = base_params["system"]
+
+        final_response = await self.client.messages.create(**final_params)
+        return final_response.content[0].text
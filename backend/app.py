@@ -69,9 +69,10 @@ async def query_documents(request: QueryRequest):
             session_id = rag_system.session_manager.create_session()
 
         # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
+        answer, sources = await rag_system.query(request.query, session_id)
 
-        return QueryResponse(answer=answer, sources=sources, session_id=session_id)
+        # Plain dict — response_model validates it once on the way out
+        return {"answer": answer, "sources": sources, "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -88,10 +89,10 @@ async def get_course_stats():
     """Get course analytics and statistics"""
     try:
         analytics = rag_system.get_course_analytics()
-        return CourseStats(
-            total_courses=analytics["total_courses"],
-            course_titles=analytics["course_titles"],
-        )
+        return {
+            "total_courses": analytics["total_courses"],
+            "course_titles": analytics["course_titles"],
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
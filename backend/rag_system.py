@@ -58,6 +58,9 @@ class RAGSystem:
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
 
+            # Cached answers may predate the new material
+            self.ai_generator.clear_response_cache()
+
             return course, len(course_chunks)
         except Exception as e:
             print(f"Error processing course document {file_path}: {e}")
@@ -83,6 +86,7 @@ class RAGSystem:
         if clear_existing:
             print("Clearing existing data for fresh rebuild...")
             self.vector_store.clear_all_data()
+            self.ai_generator.clear_response_cache()
 
         if not os.path.exists(folder_path):
             print(f"Folder {folder_path} does not exist")
@@ -119,11 +123,15 @@ class RAGSystem:
                 except Exception as e:
                     print(f"Error processing {file_name}: {e}")
 
+        # Cached answers may predate the new material
+        if total_courses:
+            self.ai_generator.clear_response_cache()
+
         return total_courses, total_chunks
 
-    def query(
+    async def query(
         self, query: str, session_id: Optional[str] = None
-    ) -> Tuple[str, List[str]]:
+    ) -> Tuple[str, List[Dict]]:
         """
         Process a user query using the RAG system with tool-based search.
 
@@ -132,7 +140,7 @@ class RAGSystem:
             session_id: Optional session ID for conversation context
 
         Returns:
-            Tuple of (response, sources list - empty for tool-based approach)
+            Tuple of (response, sources the tools found for this query)
         """
         # Create prompt for the AI with clear instructions
         prompt = f"""Answer this question about course materials: {query}"""
@@ -142,20 +150,17 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
 
-        # Generate response using AI with tools
-        try:
-            response = self.ai_generator.generate_response(
-                query=prompt,
-                conversation_history=history,
-                tools=self.tool_manager.get_tool_definitions(),
-                tool_manager=self.tool_manager,
-            )
+        # Fresh list per query — concurrent requests share the tools, not sources
+        sources: List[Dict] = []
 
-            # Get sources from the search tool
-            sources = self.tool_manager.get_last_sources()
-        finally:
-            # Always reset sources so stale data never leaks into the next request
-            self.tool_manager.reset_sources()
+        # Generate response using AI with tools
+        response = await self.ai_generator.generate_response(
+            query=prompt,
+            conversation_history=history,
+            tools=self.tool_manager.get_tool_definitions(),
+            tool_manager=self.tool_manager,
+            sources=sources,
+        )
 
         # Update conversation history
         if session_id:
@@ -1,6 +1,9 @@
-from typing import Dict, Any, Optional, Protocol
+from typing import Dict, Any, List, Optional, Protocol
 from abc import ABC, abstractmethod
-from vector_store import VectorStore, SearchResults
+from vector_store import VectorStore, SearchResults, NO_COURSE_PREFIX
+
+# Stable prefix of search results that found nothing
+NO_CONTENT_PREFIX = "No relevant content found"
 
 
 class Tool(ABC):
@@ -12,8 +15,8 @@ class Tool(ABC):
         pass
 
     @abstractmethod
-    def execute(self, **kwargs) -> str:
-        """Execute the tool with given parameters"""
+    def execute(self, sources: Optional[List[Dict[str, Any]]] = None, **kwargs) -> str:
+        """Execute the tool with given parameters, appending UI sources to sources"""
         pass
 
 
@@ -22,7 +25,6 @@ class CourseSearchTool(Tool):
 
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
-        self.last_sources = []  # Track sources from last search
 
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
@@ -54,6 +56,7 @@ class CourseSearchTool(Tool):
         query: str,
         course_name: Optional[str] = None,
         lesson_number: Optional[int] = None,
+        sources: Optional[List[Dict[str, Any]]] = None,
     ) -> str:
         """
         Execute the search tool with given parameters.
@@ -62,6 +65,7 @@ class CourseSearchTool(Tool):
             query: What to search for
             course_name: Optional course filter
             lesson_number: Optional lesson filter
+            sources: Per-query list the UI sources of the hits are appended to
 
         Returns:
             Formatted search results or error message
@@ -83,15 +87,16 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"{NO_CONTENT_PREFIX}{filter_info}."
 
         # Format and return results
-        return self._format_results(results)
+        return self._format_results(results, sources)
 
-    def _format_results(self, results: SearchResults) -> str:
+    def _format_results(
+        self, results: SearchResults, sources: Optional[List[Dict[str, Any]]]
+    ) -> str:
         """Format search results with course and lesson context"""
         formatted = []
-        sources = []  # Track sources for the UI
 
         for doc, meta in zip(results.documents, results.metadata):
             course_title = meta.get("course_title", "unknown")
@@ -104,21 +109,19 @@ class CourseSearchTool(Tool):
             header += "]"
 
             # Track source for the UI
-            label = course_title
-            if lesson_num is not None:
-                label += f" - Lesson {lesson_num}"
-            url = (
-                self.store.get_lesson_link(course_title, lesson_num)
-                if lesson_num is not None
-                else None
-            )
-            sources.append({"label": label, "url": url})
+            if sources is not None:
+                label = course_title
+                if lesson_num is not None:
+                    label += f" - Lesson {lesson_num}"
+                url = (
+                    self.store.get_lesson_link(course_title, lesson_num)
+                    if lesson_num is not None
+                    else None
+                )
+                sources.append({"label": label, "url": url})
 
             formatted.append(f"{header}\n{doc}")
 
-        # Store sources for retrieval
-        self.last_sources = sources
-
         return "\n\n".join(formatted)
 
 
@@ -127,7 +130,6 @@ class CourseOutlineTool(Tool):
 
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
-        self.last_sources = []
 
     def get_tool_definition(self) -> Dict[str, Any]:
         return {
@@ -145,15 +147,18 @@ class CourseOutlineTool(Tool):
             },
         }
 
-    def execute(self, course_name: str) -> str:
+    def execute(
+        self, course_name: str, sources: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
         outline = self.store.get_course_outline(course_name)
 
         if not outline:
-            return f"No course found matching '{course_name}'."
+            return f"{NO_COURSE_PREFIX} matching '{course_name}'."
 
-        self.last_sources = [
-            {"label": outline["title"], "url": outline.get("course_link")}
-        ]
+        if sources is not None:
+            sources.append(
+                {"label": outline["title"], "url": outline.get("course_link")}
+            )
 
         lines = [
             f"Course: {outline['title']}",
@@ -174,6 +179,7 @@ class ToolManager:
 
     def __init__(self):
         self.tools = {}
+        self.tool_definitions = []  # Built once per registration, not per query
 
     def register_tool(self, tool: Tool):
         """Register any tool that implements the Tool interface"""
@@ -182,28 +188,29 @@ class ToolManager:
         if not tool_name:
             raise ValueError("Tool must have a 'name' in its definition")
         self.tools[tool_name] = tool
+        self.tool_definitions = [
+            registered.get_tool_definition() for registered in self.tools.values()
+        ]
 
     def get_tool_definitions(self) -> list:
-        """Get all tool definitions for Anthropic tool calling"""
-        return [tool.get_tool_definition() for tool in self.tools.values()]
+        """Get all tool definitions for Anthropic tool calling (shared; do not mutate)"""
+        return self.tool_definitions
 
-    def execute_tool(self, tool_name: str, **kwargs) -> str:
-        """Execute a tool by name with given parameters"""
+    def execute_tool(
+        self, tool_name: str, sources: Optional[List[Dict[str, Any]]] = None, **kwargs
+    ) -> str:
+        """
+        Execute a tool by name with given parameters.
+
+        Sources go into the caller's list rather than onto the shared tool, so
+        concurrent queries never see each other's sources.
+        """
         if tool_name not in self.tools:
             return f"Tool '{tool_name}' not found"
 
-        return self.tools[tool_name].execute(**kwargs)
-
-    def get_last_sources(self) -> list:
-        """Get sources from the last search operation"""
-        # Check all tools for last_sources attribute
-        for tool in self.tools.values():
-            if hasattr(tool, "last_sources") and tool.last_sources:
-                return tool.last_sources
-        return []
-
-    def reset_sources(self):
-        """Reset sources from all tools that track sources"""
-        for tool in self.tools.values():
-            if hasattr(tool, "last_sources"):
-                tool.last_sources = []
+        return self.tools[tool_name].execute(sources=sources, **kwargs)
+
+    @staticmethod
+    def is_empty_result(result: str) -> bool:
+        """Check whether a tool result string reports that nothing was found"""
+        return result.startswith((NO_CONTENT_PREFIX, NO_COURSE_PREFIX))
@@ -8,8 +8,11 @@ for _p in (_backend_dir, _tests_dir):
     if str(_p) not in sys.path:
         sys.path.insert(0, str(_p))
 
+import anthropic
 import pytest
-from unittest.mock import MagicMock
+from anthropic.resources.messages import AsyncMessages
+from anthropic.resources.messages.batches import AsyncBatches
+from unittest.mock import AsyncMock, MagicMock, create_autospec, patch
 
 from vector_store import SearchResults
 
@@ -57,6 +60,26 @@ def make_text_response(text):
 # ---------------------------------------------------------------------------
 
 
+@pytest.fixture(scope="session")
+def mock_anthropic_client():
+    """
+    Session-wide AsyncAnthropic stand-in returned by ai_generator._get_client.
+
+    Autospecced down to messages and messages.batches, so unknown attributes
+    at any of those levels raise instead of spawning child mocks; tests that
+    take it must reset it before use.
+    """
+    client = create_autospec(anthropic.AsyncAnthropic, instance=True)
+    # Both resources are cached_property descriptors, which autospec cannot
+    # see through — spec them from their resource classes instead
+    client.messages = create_autospec(AsyncMessages, instance=True)
+    client.messages.batches = create_autospec(AsyncBatches, instance=True)
+    # create sits behind a sync decorator, so autospec would miss that it is async
+    client.messages.create = AsyncMock(spec=AsyncMessages.create)
+    with patch("ai_generator._get_client", return_value=client):
+        yield client
+
+
 @pytest.fixture
 def empty_search_results():
     return SearchResults(documents=[], metadata=[], distances=[])
@@ -75,13 +98,19 @@ def mock_vector_store():
     return MagicMock()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_rag_system():
-    """Return a fully configured mock RAGSystem for use across test files."""
+    """
+    Return a fully configured mock RAGSystem for use across test files.
+
+    Session-scoped: consumers must reset it between tests, keeping return values.
+    """
     mock = MagicMock()
-    mock.query.return_value = (
-        "Test answer",
-        [{"label": "Course A - Lesson 1", "url": "http://example.com"}],
+    mock.query = AsyncMock(
+        return_value=(
+            "Test answer",
+            [{"label": "Course A - Lesson 1", "url": "http://example.com"}],
+        )
     )
     mock.session_manager.create_session.return_value = "auto-created-session"
     mock.session_manager.get_conversation_history.return_value = None
@@ -1,9 +1,15 @@
-from unittest.mock import MagicMock, patch, call
+import asyncio
+import time
+from unittest.mock import ANY, AsyncMock, MagicMock, patch, call
 
 import pytest
 
 from conftest import make_tool_response, make_text_response
-from ai_generator import AIGenerator
+import ai_generator
+from ai_generator import AIGenerator, _get_client
+from search_tools import ToolManager
+
+pytestmark = pytest.mark.anyio
 
 # ---------------------------------------------------------------------------
 # Fixture: AIGenerator with mocked Anthropic client
@@ -11,53 +17,118 @@ from ai_generator import AIGenerator
 
 
 @pytest.fixture
-def generator():
-    """Return (AIGenerator instance, mock client) with Anthropic patched out."""
-    with patch("ai_generator.anthropic.Anthropic"):
-        gen = AIGenerator("fake-key", "", "", "fake-model")
-    mock_client = MagicMock()
-    gen.client = mock_client
-    return gen, mock_client
+def generator(mock_anthropic_client):
+    """Return (AIGenerator instance, mock client) using the shared client mock."""
+    mock_anthropic_client.reset_mock(return_value=True, side_effect=True)
+    gen = AIGenerator("fake-key", "", "", "fake-model")
+    return gen, mock_anthropic_client
 
 
 @pytest.fixture
 def tool_manager():
     mgr = MagicMock()
     mgr.execute_tool.return_value = "tool result text"
+    mgr.is_empty_result.side_effect = ToolManager.is_empty_result
     return mgr
 
 
+# ---------------------------------------------------------------------------
+# Client reuse
+# ---------------------------------------------------------------------------
+
+
+def _fake_client(**_):
+    """Return a client stand-in that is closable like AsyncAnthropic."""
+    client = MagicMock()
+    client.close = AsyncMock()
+    return client
+
+
+async def test_get_client_shared_per_credential_set():
+    with patch(
+        "ai_generator.anthropic.AsyncAnthropic", side_effect=_fake_client
+    ) as mock_cls:
+        first = _get_client("shared-key", "", "")
+        second = _get_client("shared-key", "", "")
+        other = _get_client("other-key", "", "")
+
+    assert first is second
+    assert other is not first
+    assert mock_cls.call_count == 2
+
+
+def test_each_event_loop_gets_working_client_closed_on_shutdown():
+    clients = []
+
+    def _loop_bound_client(**_):
+        created_on = asyncio.get_running_loop()
+
+        async def _create(**_):
+            assert asyncio.get_running_loop() is created_on, "client crossed loops"
+            return make_text_response("ok")
+
+        client = _fake_client()
+        client.messages.create = _create
+        clients.append((created_on, client))
+        return client
+
+    # Undo the session-wide mock_anthropic_client patch if it is active
+    with (
+        patch("ai_generator._get_client", _get_client),
+        patch("ai_generator.anthropic.AsyncAnthropic", side_effect=_loop_bound_client),
+    ):
+        gen = AIGenerator("fake-key", "", "", "fake-model")
+        answers = [
+            asyncio.run(gen.generate_response(query=f"query {i}")) for i in range(6)
+        ]
+
+    assert answers == ["ok"] * 6
+    assert len(clients) == 6
+    for loop, client in clients:
+        client.close.assert_awaited_once()
+        assert loop not in ai_generator._loop_clients
+
+
+def test_generator_instances_use_slots(generator):
+    gen, _ = generator
+    assert not hasattr(gen, "__dict__")
+    with pytest.raises(AttributeError):
+        gen.unexpected_attribute = True
+
+
 # ---------------------------------------------------------------------------
 # Direct response (no tool use)
 # ---------------------------------------------------------------------------
 
 
-def test_direct_response_returns_text(generator):
+async def test_direct_response_returns_text(generator):
     gen, mock_client = generator
     mock_client.messages.create.return_value = make_text_response("Direct answer")
 
-    result = gen.generate_response(
+    result = await gen.generate_response(
         query="What is Python?", tools=None, tool_manager=None
     )
 
     assert result == "Direct answer"
 
 
-def test_direct_response_does_not_call_tool_manager(generator):
+async def test_direct_response_does_not_call_tool_manager(generator):
     gen, mock_client = generator
     mock_client.messages.create.return_value = make_text_response("Direct answer")
     mock_tm = MagicMock()
 
-    gen.generate_response(query="What is Python?", tools=None, tool_manager=mock_tm)
+    await gen.generate_response(
+        query="What is Python?", tools=None, tool_manager=mock_tm
+    )
 
     mock_tm.execute_tool.assert_not_called()
 
 
-def test_conversation_history_appended_to_system_prompt(generator):
+async def test_conversation_history_appended_to_system_prompt(generator):
     gen, mock_client = generator
     mock_client.messages.create.return_value = make_text_response("ok")
 
-    gen.generate_response(
+    await gen.generate_response(
         query="Follow-up question",
         conversation_history="User: Hello\nAssistant: Hi",
         tools=None,
@@ -65,7 +136,140 @@ def test_conversation_history_appended_to_system_prompt(generator):
     )
 
     call_kwargs = mock_client.messages.create.call_args.kwargs
-    assert "User: Hello\nAssistant: Hi" in call_kwargs["system"]
+    system_blocks = call_kwargs["system"]
+    assert system_blocks[0]["text"] == AIGenerator.SYSTEM_PROMPT
+    assert "cache_control" not in system_blocks[1]
+    assert "User: Hello\nAssistant: Hi" in system_blocks[1]["text"]
+
+
+async def test_system_prompt_block_marked_for_caching(generator):
+    gen, mock_client = generator
+    mock_client.messages.create.return_value = make_text_response("ok")
+
+    await gen.generate_response(query="q", tools=None, tool_manager=None)
+
+    system_blocks = mock_client.messages.create.call_args.kwargs["system"]
+    assert len(system_blocks) == 1
+    assert system_blocks[0]["cache_control"] == {"type": "ephemeral"}
+
+
+async def test_last_tool_marked_for_caching_without_mutating_input(generator):
+    gen, mock_client = generator
+    mock_client.messages.create.return_value = make_text_response("ok")
+    tools = [{"name": "search_course_content"}, {"name": "get_course_outline"}]
+
+    await gen.generate_response(query="q", tools=tools, tool_manager=None)
+
+    sent_tools = mock_client.messages.create.call_args.kwargs["tools"]
+    assert "cache_control" not in sent_tools[0]
+    assert sent_tools[-1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in tools[-1]
+
+
+async def test_long_conversation_history_trimmed_oldest_first(generator):
+    gen, mock_client = generator
+    mock_client.messages.create.return_value = make_text_response("ok")
+    turns = [f"User: question {i} " + "x" * 400 for i in range(40)]
+
+    await gen.generate_response(
+        query="q", conversation_history="\n".join(turns), tools=None, tool_manager=None
+    )
+
+    history_text = mock_client.messages.create.call_args.kwargs["system"][1]["text"]
+    assert len(history_text) <= AIGenerator.HISTORY_TOKEN_BUDGET * 4 + 100
+    assert "[earlier turns omitted:" in history_text
+    assert turns[-1] in history_text
+    assert turns[0] not in history_text
+
+
+def test_fit_history_keeps_short_history_unchanged():
+    history = "User: Hello\nAssistant: Hi"
+    assert AIGenerator._fit_history(history, budget_tokens=100) == history
+
+
+def test_fit_history_counts_omitted_turns():
+    history = "\n".join(["User: " + "a" * 40, "Assistant: " + "b" * 40, "User: c"])
+    assert AIGenerator._fit_history(history, budget_tokens=10) == (
+        "[earlier turns omitted: 2]\nUser: c"
+    )
+
+
+def test_fit_history_drops_multiline_message_whole():
+    multiline_answer = "Assistant: " + "b" * 29 + "\n" + "c" * 40
+    history = "\n".join(
+        ["User: " + "a" * 30, multiline_answer, "User: next", "Assistant: ok"]
+    )
+
+    # The answer's last line would fit the budget, the whole answer does not
+    assert AIGenerator._fit_history(history, budget_tokens=20) == (
+        "[earlier turns omitted: 2]\nUser: next\nAssistant: ok"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------------------------
+
+
+async def test_repeated_direct_query_served_from_cache(generator):
+    gen, mock_client = generator
+    mock_client.messages.create.return_value = make_text_response("Direct answer")
+
+    first = await gen.generate_response(query="What is Python?")
+    second = await gen.generate_response(query="  what is   python? ")
+
+    assert first == second == "Direct answer"
+    mock_client.messages.create.assert_awaited_once()
+
+
+async def test_response_cache_keyed_on_history(generator):
+    gen, mock_client = generator
+    mock_client.messages.create.return_value = make_text_response("ok")
+
+    await gen.generate_response(query="q", conversation_history="User: A")
+    await gen.generate_response(query="q", conversation_history="User: B")
+
+    assert mock_client.messages.create.await_count == 2
+
+
+async def test_truncated_answers_are_not_cached(generator):
+    gen, mock_client = generator
+    truncated = make_text_response("Cut off mid-")
+    truncated.stop_reason = "max_tokens"
+    mock_client.messages.create.return_value = truncated
+
+    await gen.generate_response(query="q")
+    await gen.generate_response(query="q")
+
+    assert mock_client.messages.create.await_count == 2
+
+
+async def test_tool_use_answers_are_not_cached(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp = make_tool_response("search_course_content", "tu-1", {"query": "x"})
+    mock_client.messages.create.side_effect = [
+        tool_resp,
+        make_text_response("Answer"),
+        tool_resp,
+        make_text_response("Answer"),
+    ]
+    tools = [{"name": "search_course_content"}]
+
+    for _ in range(2):
+        await gen.generate_response(query="q", tools=tools, tool_manager=tool_manager)
+
+    assert tool_manager.execute_tool.call_count == 2
+
+
+async def test_clear_response_cache_forces_new_call(generator):
+    gen, mock_client = generator
+    mock_client.messages.create.return_value = make_text_response("ok")
+
+    await gen.generate_response(query="q")
+    gen.clear_response_cache()
+    await gen.generate_response(query="q")
+
+    assert mock_client.messages.create.await_count == 2
 
 
 # ---------------------------------------------------------------------------
@@ -73,13 +277,13 @@ def test_conversation_history_appended_to_system_prompt(generator):
 # ---------------------------------------------------------------------------
 
 
-def test_tool_use_triggers_handle_tool_execution(generator, tool_manager):
+async def test_tool_use_triggers_handle_tool_execution(generator, tool_manager):
     gen, mock_client = generator
     tool_resp = make_tool_response("search_course_content", "tu-1", {"query": "python"})
     text_resp = make_text_response("Final answer")
     mock_client.messages.create.side_effect = [tool_resp, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="python question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -88,7 +292,7 @@ def test_tool_use_triggers_handle_tool_execution(generator, tool_manager):
     tool_manager.execute_tool.assert_called_once()
 
 
-def test_execute_tool_called_with_correct_args(generator, tool_manager):
+async def test_execute_tool_called_with_correct_args(generator, tool_manager):
     gen, mock_client = generator
     tool_resp = make_tool_response(
         "search_course_content", "tu-2", {"query": "async", "course_name": "Python"}
@@ -96,25 +300,27 @@ def test_execute_tool_called_with_correct_args(generator, tool_manager):
     text_resp = make_text_response("Answer")
     mock_client.messages.create.side_effect = [tool_resp, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="async question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
     )
 
     tool_manager.execute_tool.assert_called_once_with(
-        "search_course_content", query="async", course_name="Python"
+        "search_course_content", sources=ANY, query="async", course_name="Python"
     )
 
 
-def test_second_api_call_includes_tools_for_possible_chaining(generator, tool_manager):
+async def test_second_api_call_includes_tools_for_possible_chaining(
+    generator, tool_manager
+):
     """The intermediate call re-offers tools so Claude can optionally chain a second search."""
     gen, mock_client = generator
     tool_resp = make_tool_response("search_course_content", "tu-3", {"query": "x"})
     text_resp = make_text_response("Answer")
     mock_client.messages.create.side_effect = [tool_resp, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="content question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -126,14 +332,14 @@ def test_second_api_call_includes_tools_for_possible_chaining(generator, tool_ma
     assert "tool_choice" in second_kwargs
 
 
-def test_second_api_call_messages_contain_tool_result(generator, tool_manager):
+async def test_second_api_call_messages_contain_tool_result(generator, tool_manager):
     gen, mock_client = generator
     tool_resp = make_tool_response("search_course_content", "tu-4", {"query": "x"})
     text_resp = make_text_response("Answer")
     mock_client.messages.create.side_effect = [tool_resp, text_resp]
     tool_manager.execute_tool.return_value = "search results here"
 
-    gen.generate_response(
+    await gen.generate_response(
         query="question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -150,13 +356,13 @@ def test_second_api_call_messages_contain_tool_result(generator, tool_manager):
     assert tool_result_block["content"] == "search results here"
 
 
-def test_second_api_call_messages_include_assistant_turn(generator, tool_manager):
+async def test_second_api_call_messages_include_assistant_turn(generator, tool_manager):
     gen, mock_client = generator
     tool_resp = make_tool_response("search_course_content", "tu-5", {"query": "x"})
     text_resp = make_text_response("Answer")
     mock_client.messages.create.side_effect = [tool_resp, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -169,13 +375,28 @@ def test_second_api_call_messages_include_assistant_turn(generator, tool_manager
     assert assistant_msgs[0]["content"] is tool_resp.content
 
 
-def test_final_response_text_returned(generator, tool_manager):
+async def test_first_call_messages_untouched_by_tool_rounds(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp = make_tool_response("search_course_content", "tu-7", {"query": "x"})
+    mock_client.messages.create.side_effect = [tool_resp, make_text_response("A")]
+
+    await gen.generate_response(
+        query="question",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+    )
+
+    first_messages = mock_client.messages.create.call_args_list[0].kwargs["messages"]
+    assert first_messages == [{"role": "user", "content": "question"}]
+
+
+async def test_final_response_text_returned(generator, tool_manager):
     gen, mock_client = generator
     tool_resp = make_tool_response("search_course_content", "tu-6", {"query": "x"})
     text_resp = make_text_response("The final synthesized answer")
     mock_client.messages.create.side_effect = [tool_resp, text_resp]
 
-    result = gen.generate_response(
+    result = await gen.generate_response(
         query="question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -189,12 +410,12 @@ def test_final_response_text_returned(generator, tool_manager):
 # ---------------------------------------------------------------------------
 
 
-def test_api_exception_propagates_from_generate_response(generator):
+async def test_api_exception_propagates_from_generate_response(generator):
     gen, mock_client = generator
     mock_client.messages.create.side_effect = RuntimeError("API failure")
 
     with pytest.raises(RuntimeError, match="API failure"):
-        gen.generate_response(query="test", tools=None, tool_manager=None)
+        await gen.generate_response(query="test", tools=None, tool_manager=None)
 
 
 # ---------------------------------------------------------------------------
@@ -202,6 +423,27 @@ def test_api_exception_propagates_from_generate_response(generator):
 # ---------------------------------------------------------------------------
 
 
+async def test_round_two_without_tool_blocks_skips_synthesis_call(
+    generator, tool_manager
+):
+    gen, mock_client = generator
+    tool_resp = make_tool_response("search_course_content", "tu-1", {"query": "x"})
+    # stop_reason says tool_use but the content carries only text
+    round_two_resp = make_text_response("Round two answer")
+    round_two_resp.stop_reason = "tool_use"
+    mock_client.messages.create.side_effect = [tool_resp, round_two_resp]
+
+    result = await gen.generate_response(
+        query="question",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+    )
+
+    assert result == "Round two answer"
+    assert mock_client.messages.create.call_count == 2
+    tool_manager.execute_tool.assert_called_once()
+
+
 def _two_round_side_effects():
     """Return (tool_resp_1, tool_resp_2, text_resp) for two-round tests."""
     tool_resp_1 = make_tool_response(
@@ -214,12 +456,12 @@ def _two_round_side_effects():
     return tool_resp_1, tool_resp_2, text_resp
 
 
-def test_two_tool_rounds_makes_three_api_calls(generator, tool_manager):
+async def test_two_tool_rounds_makes_three_api_calls(generator, tool_manager):
     gen, mock_client = generator
     tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
     mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="multi-step question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -228,12 +470,12 @@ def test_two_tool_rounds_makes_three_api_calls(generator, tool_manager):
     assert mock_client.messages.create.call_count == 3
 
 
-def test_intermediate_call_includes_tools(generator, tool_manager):
+async def test_intermediate_call_includes_tools(generator, tool_manager):
     gen, mock_client = generator
     tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
     mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="multi-step question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -244,12 +486,12 @@ def test_intermediate_call_includes_tools(generator, tool_manager):
     assert "tool_choice" in second_kwargs
 
 
-def test_synthesis_call_after_two_rounds_excludes_tools(generator, tool_manager):
+async def test_synthesis_call_after_two_rounds_excludes_tools(generator, tool_manager):
     gen, mock_client = generator
     tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
     mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="multi-step question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -260,7 +502,7 @@ def test_synthesis_call_after_two_rounds_excludes_tools(generator, tool_manager)
     assert "tool_choice" not in third_kwargs
 
 
-def test_two_tool_rounds_executes_both_tools(generator, tool_manager):
+async def test_two_tool_rounds_executes_both_tools(generator, tool_manager):
     gen, mock_client = generator
     tool_resp_1 = make_tool_response(
         "search_course_content", "tu-r1", {"query": "first"}
@@ -271,25 +513,27 @@ def test_two_tool_rounds_executes_both_tools(generator, tool_manager):
     text_resp = make_text_response("Two-round final answer")
     mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="multi-step question",
         tools=[{"name": "search_course_content"}, {"name": "get_course_outline"}],
         tool_manager=tool_manager,
     )
 
     assert tool_manager.execute_tool.call_count == 2
-    tool_manager.execute_tool.assert_any_call("search_course_content", query="first")
     tool_manager.execute_tool.assert_any_call(
-        "get_course_outline", course_name="Python"
+        "search_course_content", sources=ANY, query="first"
+    )
+    tool_manager.execute_tool.assert_any_call(
+        "get_course_outline", sources=ANY, course_name="Python"
     )
 
 
-def test_two_tool_rounds_returns_final_text(generator, tool_manager):
+async def test_two_tool_rounds_returns_final_text(generator, tool_manager):
     gen, mock_client = generator
     tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
     mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
 
-    result = gen.generate_response(
+    result = await gen.generate_response(
         query="multi-step question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -298,12 +542,12 @@ def test_two_tool_rounds_returns_final_text(generator, tool_manager):
     assert result == "Two-round final answer"
 
 
-def test_messages_accumulate_across_two_rounds(generator, tool_manager):
+async def test_messages_accumulate_across_two_rounds(generator, tool_manager):
     gen, mock_client = generator
     tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
     mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
 
-    gen.generate_response(
+    await gen.generate_response(
         query="multi-step question",
         tools=[{"name": "search_course_content"}],
         tool_manager=tool_manager,
@@ -321,3 +565,267 @@ def test_messages_accumulate_across_two_rounds(generator, tool_manager):
     assert messages[3]["role"] == "assistant"
     assert messages[4]["role"] == "user"
     assert messages[4]["content"][0]["type"] == "tool_result"
+
+
+# ---------------------------------------------------------------------------
+# Multiple tool_use blocks in one turn
+# ---------------------------------------------------------------------------
+
+
+def _multi_tool_response(*blocks):
+    """Return a tool_use response carrying several tool_use blocks."""
+    resp = make_tool_response(*blocks[0])
+    for name, tool_id, input_dict in blocks[1:]:
+        resp.content.append(make_tool_response(name, tool_id, input_dict).content[0])
+    return resp
+
+
+async def test_parallel_tool_results_keep_block_order(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp = _multi_tool_response(
+        ("search_course_content", "tu-a", {"query": "x"}),
+        ("get_course_outline", "tu-b", {"course_name": "Python"}),
+    )
+    mock_client.messages.create.side_effect = [
+        tool_resp,
+        make_text_response("Answer"),
+    ]
+    tool_manager.execute_tool.side_effect = lambda name, **kwargs: f"{name} result"
+
+    await gen.generate_response(
+        query="question",
+        tools=[{"name": "search_course_content"}, {"name": "get_course_outline"}],
+        tool_manager=tool_manager,
+    )
+
+    assert tool_manager.execute_tool.call_count == 2
+    messages = mock_client.messages.create.call_args_list[1].kwargs["messages"]
+    results = messages[-1]["content"]
+    assert [r["tool_use_id"] for r in results] == ["tu-a", "tu-b"]
+    assert [r["content"] for r in results] == [
+        "search_course_content result",
+        "get_course_outline result",
+    ]
+
+
+async def test_parallel_tool_sources_merged_in_block_order(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp = _multi_tool_response(
+        ("search_course_content", "tu-a", {"query": "slow"}),
+        ("search_course_content", "tu-b", {"query": "fast"}),
+    )
+    mock_client.messages.create.side_effect = [
+        tool_resp,
+        make_text_response("Answer"),
+    ]
+
+    def _execute(name, sources, query):
+        if query == "slow":
+            time.sleep(0.05)  # finish after the second block's call
+        sources.append({"label": query, "url": None})
+        return f"{query} result"
+
+    tool_manager.execute_tool.side_effect = _execute
+    sources = []
+
+    await gen.generate_response(
+        query="question",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+        sources=sources,
+    )
+
+    assert sources == [{"label": "slow", "url": None}, {"label": "fast", "url": None}]
+
+
+async def test_repeated_tool_call_across_rounds_executes_once(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp_1 = make_tool_response(
+        "search_course_content", "tu-r1", {"query": "python", "lesson_number": 1}
+    )
+    tool_resp_2 = make_tool_response(
+        "search_course_content", "tu-r2", {"lesson_number": 1, "query": "python"}
+    )
+    mock_client.messages.create.side_effect = [
+        tool_resp_1,
+        tool_resp_2,
+        make_text_response("Answer"),
+    ]
+
+    await gen.generate_response(
+        query="question",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+    )
+
+    tool_manager.execute_tool.assert_called_once_with(
+        "search_course_content", sources=ANY, query="python", lesson_number=1
+    )
+    messages = mock_client.messages.create.call_args_list[2].kwargs["messages"]
+    assert messages[4]["content"][0]["tool_use_id"] == "tu-r2"
+    assert messages[4]["content"][0]["content"] == "tool result text"
+
+
+async def test_repeated_tool_call_with_list_input_executes_once(
+    generator, tool_manager
+):
+    gen, mock_client = generator
+    tool_resp = _multi_tool_response(
+        ("search_course_content", "tu-a", {"query": "x", "lessons": [1, 2]}),
+        ("search_course_content", "tu-b", {"lessons": [1, 2], "query": "x"}),
+    )
+    mock_client.messages.create.side_effect = [
+        tool_resp,
+        make_text_response("Answer"),
+    ]
+
+    await gen.generate_response(
+        query="question",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+    )
+
+    tool_manager.execute_tool.assert_called_once_with(
+        "search_course_content", sources=ANY, query="x", lessons=[1, 2]
+    )
+
+
+async def test_synthesis_call_sends_every_tool_result_verbatim(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
+    mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
+    long_result = "course text " * 50
+    tool_manager.execute_tool.side_effect = [long_result, "second result"]
+
+    await gen.generate_response(
+        query="multi-step question",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+    )
+
+    third_messages = mock_client.messages.create.call_args_list[2].kwargs["messages"]
+    assert third_messages[2]["content"][0]["tool_use_id"] == "tu-r1"
+    assert third_messages[2]["content"][0]["content"] == long_result
+    assert third_messages[4]["content"][0]["content"] == "second result"
+
+
+# ---------------------------------------------------------------------------
+# Message Batches
+# ---------------------------------------------------------------------------
+
+
+def _batch_entry(custom_id, result_type, message=None):
+    entry = MagicMock()
+    entry.custom_id = custom_id
+    entry.result.type = result_type
+    entry.result.message = message
+    return entry
+
+
+def _mock_batches(mock_client, entries):
+    """Wire client.messages.batches so the batch ends after one poll."""
+
+    async def _results():
+        for entry in entries:
+            yield entry
+
+    pending, ended = MagicMock(), MagicMock()
+    pending.id = ended.id = "batch-1"
+    pending.processing_status = "in_progress"
+    ended.processing_status = "ended"
+    mock_client.messages.batches.create.return_value = pending
+    mock_client.messages.batches.retrieve.return_value = ended
+    mock_client.messages.batches.results.return_value = _results()
+
+
+async def test_batch_submits_one_request_per_query(generator):
+    gen, mock_client = generator
+    _mock_batches(
+        mock_client,
+        [
+            _batch_entry("query-1", "succeeded", make_text_response("Second")),
+            _batch_entry("query-0", "succeeded", make_text_response("First")),
+        ],
+    )
+
+    result = await gen.generate_responses_batch(["q0", "q1"], poll_interval=0)
+
+    assert result == ["First", "Second"]
+    requests = mock_client.messages.batches.create.call_args.kwargs["requests"]
+    assert [r["custom_id"] for r in requests] == ["query-0", "query-1"]
+    assert requests[1]["params"]["messages"] == [{"role": "user", "content": "q1"}]
+    mock_client.messages.batches.retrieve.assert_awaited_once_with("batch-1")
+    mock_client.messages.create.assert_not_called()
+
+
+async def test_batch_tool_use_reply_continues_interactively(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp = make_tool_response("search_course_content", "tu-1", {"query": "x"})
+    _mock_batches(mock_client, [_batch_entry("query-0", "succeeded", tool_resp)])
+    mock_client.messages.create.return_value = make_text_response("Tool answer")
+
+    result = await gen.generate_responses_batch(
+        ["q0"],
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+        poll_interval=0,
+    )
+
+    assert result == ["Tool answer"]
+    tool_manager.execute_tool.assert_called_once_with(
+        "search_course_content", sources=ANY, query="x"
+    )
+
+
+async def test_batch_failed_entry_is_rerun_interactively(generator):
+    gen, mock_client = generator
+    _mock_batches(mock_client, [_batch_entry("query-0", "errored")])
+    mock_client.messages.create.return_value = make_text_response("Retried")
+
+    result = await gen.generate_responses_batch(["q0"], poll_interval=0)
+
+    assert result == ["Retried"]
+    mock_client.messages.create.assert_awaited_once()
+
+
+# ---------------------------------------------------------------------------
+# Empty tool results
+# ---------------------------------------------------------------------------
+
+
+async def test_all_empty_results_skip_synthesis_call(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
+    mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
+    tool_manager.execute_tool.side_effect = [
+        "No relevant content found.",
+        "No course found matching 'Rust'.",
+    ]
+
+    result = await gen.generate_response(
+        query="q",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+    )
+
+    assert result == AIGenerator.NO_RESULTS_RESPONSE
+    assert mock_client.messages.create.call_count == 2
+
+
+async def test_one_nonempty_result_still_synthesizes(generator, tool_manager):
+    gen, mock_client = generator
+    tool_resp_1, tool_resp_2, text_resp = _two_round_side_effects()
+    mock_client.messages.create.side_effect = [tool_resp_1, tool_resp_2, text_resp]
+    tool_manager.execute_tool.side_effect = [
+        "[Python Basics - Lesson 1]\nSome content",
+        "No relevant content found.",
+    ]
+
+    result = await gen.generate_response(
+        query="q",
+        tools=[{"name": "search_course_content"}],
+        tool_manager=tool_manager,
+    )
+
+    assert result == "Two-round final answer"
+    assert mock_client.messages.create.call_count == 3
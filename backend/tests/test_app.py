@@ -5,6 +5,9 @@ The production app.py mounts static files from ../frontend which doesn't exist
 in the test environment, so we define a minimal test app inline that mirrors
 the same endpoint logic and use FastAPI's TestClient against it.
 """
+
+import functools
+import operator
 from typing import Any, Dict, List, Optional
 from unittest.mock import MagicMock
 
@@ -13,11 +16,18 @@ from fastapi import FastAPI, HTTPException
 from fastapi.testclient import TestClient
 from pydantic import BaseModel
 
+# Request bodies — httpx only serializes them, so tests can share one dict each
+QUERY_BODY = {"query": "What is Python?", "session_id": "s1"}
+NO_SESSION_BODY = {"query": "test"}
+MISSING_QUERY_BODY = {"session_id": "s1"}
+ERROR_BODY = {"query": "test", "session_id": "s1"}
+
 
 # ---------------------------------------------------------------------------
 # Pydantic models — identical to those in app.py
 # ---------------------------------------------------------------------------
 
+
 class QueryRequest(BaseModel):
     query: str
     session_id: Optional[str] = None
@@ -38,8 +48,14 @@ class CourseStats(BaseModel):
 # Test app factory
 # ---------------------------------------------------------------------------
 
+
+@functools.lru_cache(maxsize=None)
 def _make_app(rag) -> FastAPI:
-    """Return a minimal FastAPI app wired to *rag* (a mock or real RAGSystem)."""
+    """
+    Return a minimal FastAPI app wired to *rag* (a mock or real RAGSystem).
+
+    Cached per *rag*: mocks hash by identity, so each one gets its routes built once.
+    """
     app = FastAPI()
 
     @app.post("/api/query", response_model=QueryResponse)
@@ -48,8 +64,9 @@ def _make_app(rag) -> FastAPI:
             session_id = request.session_id
             if not session_id:
                 session_id = rag.session_manager.create_session()
-            answer, sources = rag.query(request.query, session_id)
-            return QueryResponse(answer=answer, sources=sources, session_id=session_id)
+            answer, sources = await rag.query(request.query, session_id)
+            # Plain dict — response_model validates it once on the way out
+            return {"answer": answer, "sources": sources, "session_id": session_id}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -62,10 +79,10 @@ def _make_app(rag) -> FastAPI:
     async def get_course_stats():
         try:
             analytics = rag.get_course_analytics()
-            return CourseStats(
-                total_courses=analytics["total_courses"],
-                course_titles=analytics["course_titles"],
-            )
+            return {
+                "total_courses": analytics["total_courses"],
+                "course_titles": analytics["course_titles"],
+            }
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -76,134 +93,121 @@ def _make_app(rag) -> FastAPI:
 # Fixtures
 # ---------------------------------------------------------------------------
 
-@pytest.fixture
+
+@pytest.fixture(scope="session")
 def mock_rag(mock_rag_system):
     """Alias the shared conftest fixture under a shorter name."""
     return mock_rag_system
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client(mock_rag):
-    return TestClient(_make_app(mock_rag))
-
-
-# ---------------------------------------------------------------------------
-# POST /api/query — happy path
-# ---------------------------------------------------------------------------
-
-def test_query_returns_200(client):
-    resp = client.post("/api/query", json={"query": "What is Python?", "session_id": "s1"})
-    assert resp.status_code == 200
-
-
-def test_query_response_contains_answer(client):
-    resp = client.post("/api/query", json={"query": "What is Python?", "session_id": "s1"})
-    assert resp.json()["answer"] == "Test answer"
-
-
-def test_query_response_contains_sources(client):
-    resp = client.post("/api/query", json={"query": "What is Python?", "session_id": "s1"})
-    sources = resp.json()["sources"]
-    assert isinstance(sources, list)
-    assert sources[0]["label"] == "Course A - Lesson 1"
-    assert sources[0]["url"] == "http://example.com"
-
-
-def test_query_echoes_session_id(client):
-    resp = client.post("/api/query", json={"query": "test", "session_id": "my-session"})
-    assert resp.json()["session_id"] == "my-session"
-
-
-def test_query_calls_rag_with_correct_args(client, mock_rag):
-    client.post("/api/query", json={"query": "What is Python?", "session_id": "s1"})
-    mock_rag.query.assert_called_once_with("What is Python?", "s1")
-
-
-# ---------------------------------------------------------------------------
-# POST /api/query — auto session creation
-# ---------------------------------------------------------------------------
-
-def test_query_without_session_id_creates_session(client, mock_rag):
-    resp = client.post("/api/query", json={"query": "test"})
-    assert resp.status_code == 200
-    mock_rag.session_manager.create_session.assert_called_once()
-
-
-def test_query_without_session_id_returns_generated_id(client):
-    resp = client.post("/api/query", json={"query": "test"})
-    assert resp.json()["session_id"] == "auto-created-session"
-
-
-# ---------------------------------------------------------------------------
-# POST /api/query — validation & error handling
-# ---------------------------------------------------------------------------
-
-def test_query_missing_query_field_returns_422(client):
-    resp = client.post("/api/query", json={"session_id": "s1"})
-    assert resp.status_code == 422
+    """
+    Build the test app once; every test reuses its routing table.
+
+    Entering the TestClient keeps one event-loop portal open for the whole
+    session instead of starting a fresh one for each request.
+    """
+    with TestClient(_make_app(mock_rag)) as test_client:
+        yield test_client
+
+
+@pytest.fixture(autouse=True)
+def _reset_mock_rag(mock_rag):
+    """Clear calls and side effects a test left on the shared mock."""
+    yield
+    mock_rag.reset_mock(side_effect=True)
+
+
+# ---------------------------------------------------------------------------
+# Endpoint contract — one request per row covers status, body and the RAG call
+# ---------------------------------------------------------------------------
+
+# (method, path, body, status, expected body items, (mock attribute, call args))
+CASES = [
+    (
+        "POST",
+        "/api/query",
+        QUERY_BODY,
+        200,
+        {
+            "answer": "Test answer",
+            "session_id": "s1",
+            "sources": [{"label": "Course A - Lesson 1", "url": "http://example.com"}],
+        },
+        ("query", ("What is Python?", "s1")),
+    ),
+    (
+        "POST",
+        "/api/query",
+        NO_SESSION_BODY,
+        200,
+        {"session_id": "auto-created-session"},
+        ("session_manager.create_session", ()),
+    ),
+    ("POST", "/api/query", MISSING_QUERY_BODY, 422, {}, None),
+    (
+        "GET",
+        "/api/courses",
+        None,
+        200,
+        {"total_courses": 2, "course_titles": ["Python Basics", "Advanced Python"]},
+        ("get_course_analytics", ()),
+    ),
+    (
+        "DELETE",
+        "/api/session/target-session",
+        None,
+        200,
+        {"status": "ok"},
+        ("session_manager.clear_session", ("target-session",)),
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "method,path,body,status,expected,call",
+    CASES,
+    ids=[
+        "query",
+        "query-no-session",
+        "query-missing-field",
+        "courses",
+        "delete-session",
+    ],
+)
+def test_endpoint(client, mock_rag, method, path, body, status, expected, call):
+    resp = client.request(method, path, json=body)
+
+    assert resp.status_code == status
+    payload = resp.json()
+    for key, value in expected.items():
+        assert payload[key] == value
+
+    if call:
+        attr, args = call
+        operator.attrgetter(attr)(mock_rag).assert_called_once_with(*args)
+
+
+# ---------------------------------------------------------------------------
+# Error handling — a failing RAG call surfaces as a 500 with its message
+# ---------------------------------------------------------------------------
+
+ERROR_CASES = [
+    ("POST", "/api/query", ERROR_BODY, "query", "Something went wrong"),
+    ("GET", "/api/courses", None, "get_course_analytics", "DB error"),
+]
+
+
+@pytest.mark.parametrize(
+    "method,path,body,attr,message", ERROR_CASES, ids=["query", "courses"]
+)
+def test_endpoint_returns_500_with_detail_when_rag_raises(
+    client, mock_rag, method, path, body, attr, message
+):
+    getattr(mock_rag, attr).side_effect = RuntimeError(message)
+
+    resp = client.request(method, path, json=body)
 
-
-def test_query_returns_500_when_rag_raises(client, mock_rag):
-    mock_rag.query.side_effect = RuntimeError("Something went wrong")
-    resp = client.post("/api/query", json={"query": "test", "session_id": "s1"})
     assert resp.status_code == 500
-
-
-def test_query_500_response_includes_error_detail(client, mock_rag):
-    mock_rag.query.side_effect = RuntimeError("Something went wrong")
-    resp = client.post("/api/query", json={"query": "test", "session_id": "s1"})
-    assert "Something went wrong" in resp.json()["detail"]
-
-
-# ---------------------------------------------------------------------------
-# GET /api/courses — happy path
-# ---------------------------------------------------------------------------
-
-def test_courses_returns_200(client):
-    assert client.get("/api/courses").status_code == 200
-
-
-def test_courses_returns_correct_total(client):
-    assert client.get("/api/courses").json()["total_courses"] == 2
-
-
-def test_courses_returns_titles_list(client):
-    titles = client.get("/api/courses").json()["course_titles"]
-    assert "Python Basics" in titles
-    assert "Advanced Python" in titles
-
-
-def test_courses_calls_get_course_analytics(client, mock_rag):
-    client.get("/api/courses")
-    mock_rag.get_course_analytics.assert_called_once()
-
-
-# ---------------------------------------------------------------------------
-# GET /api/courses — error handling
-# ---------------------------------------------------------------------------
-
-def test_courses_returns_500_when_analytics_raises(client, mock_rag):
-    mock_rag.get_course_analytics.side_effect = RuntimeError("DB error")
-    assert client.get("/api/courses").status_code == 500
-
-
-def test_courses_500_includes_error_detail(client, mock_rag):
-    mock_rag.get_course_analytics.side_effect = RuntimeError("DB error")
-    assert "DB error" in client.get("/api/courses").json()["detail"]
-
-
-# ---------------------------------------------------------------------------
-# DELETE /api/session/{session_id}
-# ---------------------------------------------------------------------------
-
-def test_delete_session_returns_200(client):
-    assert client.delete("/api/session/some-session").status_code == 200
-
-
-def test_delete_session_returns_ok_body(client):
-    assert client.delete("/api/session/some-session").json() == {"status": "ok"}
-
-
-def test_delete_session_calls_clear_session(client, mock_rag):
-    client.delete("/api/session/target-session")
-    mock_rag.session_manager.clear_session.assert_called_once_with("target-session")
+    assert message in resp.json()["detail"]
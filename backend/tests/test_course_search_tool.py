@@ -1,10 +1,60 @@
+from types import SimpleNamespace
 from unittest.mock import MagicMock
 
 import pytest
 
 from conftest import make_search_results
-from search_tools import CourseSearchTool
-from vector_store import SearchResults
+from search_tools import CourseSearchTool, ToolManager
+from vector_store import SearchResults, VectorStore
+
+# Shared results — CourseSearchTool only reads them, so one instance serves all
+EMPTY_RESULTS = SearchResults(documents=[], metadata=[], distances=[])
+ERROR_RESULTS = SearchResults.empty("Search error: boom")
+SINGLE_RESULT = make_search_results(
+    docs=["Content"],
+    metas=[{"course_title": "Test Course", "lesson_number": 1}],
+)
+MULTI_RESULT = make_search_results(
+    docs=["Content about Python", "More Python content"],
+    metas=[
+        {"course_title": "Python Basics", "lesson_number": 1},
+        {"course_title": "Python Basics", "lesson_number": 2},
+    ],
+)
+
+# ---------------------------------------------------------------------------
+# Helpers & fixtures: CourseSearchTool over a stub or mock store
+# ---------------------------------------------------------------------------
+
+
+def _stub_tool(results, lesson_link=None):
+    """Return a CourseSearchTool over a plain stub store that records nothing."""
+    store = SimpleNamespace(
+        search=lambda **_: results,
+        get_lesson_link=lambda *_: lesson_link,
+    )
+    return CourseSearchTool(store)
+
+
+@pytest.fixture
+def empty_search_tool():
+    """Return a tool whose store finds nothing."""
+    return _stub_tool(EMPTY_RESULTS)
+
+
+@pytest.fixture(params=[EMPTY_RESULTS, ERROR_RESULTS], ids=["empty", "error"])
+def miss_search_tool(request):
+    """Return a tool whose store either finds nothing or fails."""
+    return _stub_tool(request.param)
+
+
+@pytest.fixture
+def recording_search_tool():
+    """Return (tool, MagicMock store) for tests that assert on store calls."""
+    store = MagicMock()
+    store.search.return_value = EMPTY_RESULTS
+    return CourseSearchTool(store), store
+
 
 # ---------------------------------------------------------------------------
 # Happy path
@@ -12,17 +62,8 @@ from vector_store import SearchResults
 
 
 def test_execute_returns_formatted_results():
-    store = MagicMock()
-    store.search.return_value = make_search_results(
-        docs=["Content about Python", "More Python content"],
-        metas=[
-            {"course_title": "Python Basics", "lesson_number": 1},
-            {"course_title": "Python Basics", "lesson_number": 2},
-        ],
-    )
-    store.get_lesson_link.return_value = "http://example.com/lesson"
+    tool = _stub_tool(MULTI_RESULT, lesson_link="http://example.com/lesson")
 
-    tool = CourseSearchTool(store)
     result = tool.execute(query="Python")
 
     assert "Python Basics" in result
@@ -31,33 +72,25 @@ def test_execute_returns_formatted_results():
 
 
 def test_formatted_results_include_header_prefix():
-    store = MagicMock()
-    store.search.return_value = make_search_results(
-        docs=["Some content"],
-        metas=[{"course_title": "My Course", "lesson_number": 3}],
+    tool = _stub_tool(
+        make_search_results(
+            docs=["Some content"],
+            metas=[{"course_title": "My Course", "lesson_number": 3}],
+        )
     )
-    store.get_lesson_link.return_value = None
 
-    tool = CourseSearchTool(store)
     result = tool.execute(query="something")
 
     assert "[My Course - Lesson 3]" in result
 
 
-def test_last_sources_populated_after_search():
-    store = MagicMock()
-    store.search.return_value = make_search_results(
-        docs=["Content"],
-        metas=[{"course_title": "Test Course", "lesson_number": 1}],
-    )
-    store.get_lesson_link.return_value = "http://example.com"
+def test_sources_appended_after_search():
+    tool = _stub_tool(SINGLE_RESULT, lesson_link="http://example.com")
+    sources = []
 
-    tool = CourseSearchTool(store)
-    tool.execute(query="test")
+    tool.execute(query="test", sources=sources)
 
-    assert len(tool.last_sources) == 1
-    assert tool.last_sources[0]["label"] == "Test Course - Lesson 1"
-    assert tool.last_sources[0]["url"] == "http://example.com"
+    assert sources == [{"label": "Test Course - Lesson 1", "url": "http://example.com"}]
 
 
 # ---------------------------------------------------------------------------
@@ -65,35 +98,25 @@ def test_last_sources_populated_after_search():
 # ---------------------------------------------------------------------------
 
 
-def test_execute_empty_results_returns_no_content_message():
-    store = MagicMock()
-    store.search.return_value = SearchResults(documents=[], metadata=[], distances=[])
-
-    tool = CourseSearchTool(store)
-    result = tool.execute(query="something")
+def test_execute_empty_results_returns_no_content_message(empty_search_tool):
+    result = empty_search_tool.execute(query="something")
 
     assert "No relevant content found" in result
 
 
-def test_empty_results_with_course_filter_mentions_course():
-    store = MagicMock()
-    store.search.return_value = SearchResults(documents=[], metadata=[], distances=[])
-
-    tool = CourseSearchTool(store)
-    result = tool.execute(query="something", course_name="Python Basics")
+def test_empty_results_with_course_filter_mentions_course(empty_search_tool):
+    result = empty_search_tool.execute(query="something", course_name="Python Basics")
 
     assert "No relevant content found" in result
     assert "Python Basics" in result
 
 
-def test_last_sources_empty_when_no_results():
-    store = MagicMock()
-    store.search.return_value = SearchResults(documents=[], metadata=[], distances=[])
+def test_no_sources_appended_when_no_results(miss_search_tool):
+    sources = []
 
-    tool = CourseSearchTool(store)
-    tool.execute(query="something")
+    miss_search_tool.execute(query="something", sources=sources)
 
-    assert tool.last_sources == []
+    assert sources == []
 
 
 # ---------------------------------------------------------------------------
@@ -102,24 +125,30 @@ def test_last_sources_empty_when_no_results():
 
 
 def test_execute_returns_error_string_from_store():
-    store = MagicMock()
     error_msg = (
         "Search error: n_results cannot be greater than "
         "the number of elements in the index"
     )
-    store.search.return_value = SearchResults.empty(error_msg)
+    tool = _stub_tool(SearchResults.empty(error_msg))
 
-    tool = CourseSearchTool(store)
     result = tool.execute(query="something")
 
     assert result == error_msg
 
 
-def test_store_called_with_correct_filters():
-    store = MagicMock()
-    store.search.return_value = SearchResults(documents=[], metadata=[], distances=[])
-
+def test_unresolved_course_error_counts_as_empty():
+    store = VectorStore.__new__(VectorStore)  # skip ChromaDB setup
+    store._resolve_course_name = lambda _: None
     tool = CourseSearchTool(store)
+
+    result = tool.execute(query="something", course_name="Rust")
+
+    assert ToolManager.is_empty_result(result)
+
+
+def test_store_called_with_correct_filters(recording_search_tool):
+    tool, store = recording_search_tool
+
     tool.execute(query="Python", course_name="Python Basics", lesson_number=2)
 
     store.search.assert_called_once_with(
@@ -127,11 +156,9 @@ def test_store_called_with_correct_filters():
     )
 
 
-def test_execute_with_no_lesson_number_passes_none():
-    store = MagicMock()
-    store.search.return_value = SearchResults(documents=[], metadata=[], distances=[])
+def test_execute_with_no_lesson_number_passes_none(recording_search_tool):
+    tool, store = recording_search_tool
 
-    tool = CourseSearchTool(store)
     tool.execute(query="Python", course_name="Python Basics")
 
     store.search.assert_called_once_with(
@@ -1,61 +1,85 @@
-from unittest.mock import MagicMock, patch
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from conftest import make_search_results, make_text_response, make_tool_response
 from rag_system import RAGSystem
 
+pytestmark = pytest.mark.anyio
+
+# Plain values for everything RAGSystem.__init__ reads from its config
+TEST_CONFIG = SimpleNamespace(
+    ANTHROPIC_API_KEY="fake-key",
+    ANTHROPIC_BASE_URL="",
+    ANTHROPIC_AUTH_TOKEN="",
+    ANTHROPIC_MODEL="fake-model",
+    CHUNK_SIZE=800,
+    CHUNK_OVERLAP=100,
+    CHROMA_PATH="/tmp/test_chroma",
+    EMBEDDING_MODEL="fake-embed",
+    MAX_RESULTS=5,
+    MAX_HISTORY=2,
+)
+
 # ---------------------------------------------------------------------------
 # Fixture: RAGSystem with all heavy dependencies mocked out
 # ---------------------------------------------------------------------------
 
 
-@pytest.fixture
+def _apply_default_returns(mock_ai, mock_session):
+    """Set the return values every test starts from."""
+    mock_ai.generate_response = AsyncMock(return_value="mocked answer")
+    mock_session.get_conversation_history.return_value = None
+
+
+@pytest.fixture(scope="module")
 def rag_setup():
     """
-    Return (rag, mock_ai, mock_session).
+    Return (rag, mock_ai, mock_session), built once for the module.
 
     AIGenerator, VectorStore, DocumentProcessor, and SessionManager constructors
-    are patched so no real I/O or model loading happens.
+    are patched so no real I/O or model loading happens. The patches are only
+    needed while RAGSystem.__init__ runs; afterwards rag holds the mocks.
     """
-    mock_config = MagicMock()
-    mock_config.ANTHROPIC_API_KEY = "fake-key"
-    mock_config.ANTHROPIC_BASE_URL = ""
-    mock_config.ANTHROPIC_AUTH_TOKEN = ""
-    mock_config.ANTHROPIC_MODEL = "fake-model"
-    mock_config.CHUNK_SIZE = 800
-    mock_config.CHUNK_OVERLAP = 100
-    mock_config.CHROMA_PATH = "/tmp/test_chroma"
-    mock_config.EMBEDDING_MODEL = "fake-embed"
-    mock_config.MAX_RESULTS = 5
-    mock_config.MAX_HISTORY = 2
-
+    # The AI and session mocks stay MagicMocks: tests assert on their calls.
+    # The store and processor are never called here, so bare stubs suffice.
     mock_ai = MagicMock()
-    mock_ai.generate_response.return_value = "mocked answer"
-
     mock_session = MagicMock()
-    mock_session.get_conversation_history.return_value = None
-
-    with (
-        patch("rag_system.AIGenerator", return_value=mock_ai),
-        patch("rag_system.VectorStore", return_value=MagicMock()),
-        patch("rag_system.DocumentProcessor", return_value=MagicMock()),
-        patch("rag_system.SessionManager", return_value=mock_session),
+    _apply_default_returns(mock_ai, mock_session)
+
+    with patch.multiple(
+        "rag_system",
+        AIGenerator=MagicMock(return_value=mock_ai),
+        VectorStore=MagicMock(return_value=SimpleNamespace()),
+        DocumentProcessor=MagicMock(return_value=SimpleNamespace()),
+        SessionManager=MagicMock(return_value=mock_session),
     ):
-        rag = RAGSystem(mock_config)
+        rag = RAGSystem(TEST_CONFIG)
 
     return rag, mock_ai, mock_session
 
 
+@pytest.fixture(autouse=True)
+def _reset_rag_setup(rag_setup):
+    """Restore the shared mocks a previous test may have changed."""
+    _, mock_ai, mock_session = rag_setup
+    mock_ai.reset_mock(return_value=True, side_effect=True)
+    mock_session.reset_mock(return_value=True, side_effect=True)
+    _apply_default_returns(mock_ai, mock_session)
+
+
 # ---------------------------------------------------------------------------
 # Happy path
 # ---------------------------------------------------------------------------
 
 
-def test_query_returns_response_and_sources(rag_setup):
+async def test_query_returns_response_and_sources(rag_setup):
     rag, mock_ai, _ = rag_setup
     mock_ai.generate_response.return_value = "Test answer"
 
-    result = rag.query("What is Python?")
+    result = await rag.query("What is Python?")
 
     assert isinstance(result, tuple)
     assert len(result) == 2
@@ -63,19 +87,19 @@ def test_query_returns_response_and_sources(rag_setup):
     assert isinstance(result[1], list)
 
 
-def test_query_builds_prompt_with_prefix(rag_setup):
+async def test_query_builds_prompt_with_prefix(rag_setup):
     rag, mock_ai, _ = rag_setup
 
-    rag.query("What is Python?")
+    await rag.query("What is Python?")
 
     call_kwargs = mock_ai.generate_response.call_args.kwargs
     assert "What is Python?" in call_kwargs["query"]
 
 
-def test_query_passes_tool_definitions_to_generator(rag_setup):
+async def test_query_passes_tool_definitions_to_generator(rag_setup):
     rag, mock_ai, _ = rag_setup
 
-    rag.query("something")
+    await rag.query("something")
 
     call_kwargs = mock_ai.generate_response.call_args.kwargs
     tools = call_kwargs.get("tools")
@@ -84,37 +108,47 @@ def test_query_passes_tool_definitions_to_generator(rag_setup):
     assert len(tools) > 0
 
 
-# ---------------------------------------------------------------------------
-# Session handling
-# ---------------------------------------------------------------------------
+async def test_tool_definitions_reused_across_queries(rag_setup):
+    rag, mock_ai, _ = rag_setup
 
+    await rag.query("first")
+    await rag.query("second")
 
-def test_query_with_session_id_passes_history(rag_setup):
-    rag, mock_ai, mock_session = rag_setup
-    mock_session.get_conversation_history.return_value = "Previous: User asked about X"
+    first_call, second_call = mock_ai.generate_response.call_args_list
+    assert first_call.kwargs["tools"] is second_call.kwargs["tools"]
 
-    rag.query("follow-up question", session_id="sess-123")
 
-    mock_session.get_conversation_history.assert_called_once_with("sess-123")
-    call_kwargs = mock_ai.generate_response.call_args.kwargs
-    assert call_kwargs["conversation_history"] == "Previous: User asked about X"
+# ---------------------------------------------------------------------------
+# Session handling
+# ---------------------------------------------------------------------------
 
 
-def test_query_without_session_id_passes_no_history(rag_setup):
+@pytest.mark.parametrize(
+    "session_id,history",
+    [("sess-123", "Previous: User asked about X"), (None, None)],
+    ids=["with-session", "without-session"],
+)
+async def test_query_passes_history_only_with_session_id(
+    rag_setup, session_id, history
+):
     rag, mock_ai, mock_session = rag_setup
+    mock_session.get_conversation_history.return_value = history
 
-    rag.query("standalone question")  # no session_id
+    await rag.query("question", session_id=session_id)
 
-    mock_session.get_conversation_history.assert_not_called()
+    if session_id:
+        mock_session.get_conversation_history.assert_called_once_with(session_id)
+    else:
+        mock_session.get_conversation_history.assert_not_called()
     call_kwargs = mock_ai.generate_response.call_args.kwargs
-    assert call_kwargs["conversation_history"] is None
+    assert call_kwargs["conversation_history"] == history
 
 
-def test_session_exchange_recorded_after_response(rag_setup):
+async def test_session_exchange_recorded_after_response(rag_setup):
     rag, mock_ai, mock_session = rag_setup
     mock_ai.generate_response.return_value = "The answer"
 
-    rag.query("What is X?", session_id="sess-456")
+    await rag.query("What is X?", session_id="sess-456")
 
     mock_session.add_exchange.assert_called_once_with(
         "sess-456", "What is X?", "The answer"
@@ -126,25 +160,31 @@ def test_session_exchange_recorded_after_response(rag_setup):
 # ---------------------------------------------------------------------------
 
 
-def test_sources_from_search_tool_returned(rag_setup):
-    rag, _, _ = rag_setup
-    # Simulate that a tool search populated last_sources before query() collects them
-    rag.search_tool.last_sources = [
-        {"label": "Course A - Lesson 1", "url": "http://a.com"}
-    ]
+async def test_sources_collected_during_generation_returned(rag_setup):
+    rag, mock_ai, _ = rag_setup
+
+    # Simulate a tool search appending to the query's sources list
+    async def _generate(**kwargs):
+        kwargs["sources"].append(
+            {"label": "Course A - Lesson 1", "url": "http://a.com"}
+        )
+        return "answer"
 
-    _, sources = rag.query("question")
+    mock_ai.generate_response.side_effect = _generate
+
+    _, sources = await rag.query("question")
 
     assert sources == [{"label": "Course A - Lesson 1", "url": "http://a.com"}]
 
 
-def test_sources_reset_after_query(rag_setup):
-    rag, _, _ = rag_setup
-    rag.search_tool.last_sources = [{"label": "Something", "url": None}]
+async def test_each_query_collects_into_a_fresh_sources_list(rag_setup):
+    rag, mock_ai, _ = rag_setup
 
-    rag.query("question")
+    await rag.query("first")
+    await rag.query("second")
 
-    assert rag.search_tool.last_sources == []
+    first_call, second_call = mock_ai.generate_response.call_args_list
+    assert first_call.kwargs["sources"] is not second_call.kwargs["sources"]
 
 
 # ---------------------------------------------------------------------------
@@ -152,10 +192,59 @@ def test_sources_reset_after_query(rag_setup):
 # ---------------------------------------------------------------------------
 
 
-def test_exception_from_generator_propagates(rag_setup):
+async def test_exception_from_generator_propagates(rag_setup):
     """Exceptions from generate_response must bubble up to app.py (no silent swallowing)."""
     rag, mock_ai, _ = rag_setup
     mock_ai.generate_response.side_effect = RuntimeError("API failed")
 
     with pytest.raises(RuntimeError, match="API failed"):
-        rag.query("question")
+        await rag.query("question")
+
+
+# ---------------------------------------------------------------------------
+# Concurrent queries — one shared ToolManager, one sources list per query
+# ---------------------------------------------------------------------------
+
+
+def _topic_store():
+    """Return a stub store whose only hit is lesson 1 of the course named by the query."""
+    return SimpleNamespace(
+        search=lambda query, **_: make_search_results(
+            docs=[f"{query} content"],
+            metas=[{"course_title": query, "lesson_number": 1}],
+        ),
+        get_lesson_link=lambda *_: None,
+    )
+
+
+async def test_concurrent_queries_keep_their_own_sources(mock_anthropic_client):
+    mock_anthropic_client.reset_mock(return_value=True, side_effect=True)
+    both_searched = asyncio.Barrier(2)
+
+    async def _create(**params):
+        messages = params["messages"]
+        topic = messages[0]["content"].rsplit(" ", 1)[-1]
+        if len(messages) == 1:
+            return make_tool_response(
+                "search_course_content", f"tu-{topic}", {"query": topic}
+            )
+        # Hold each answer until both queries have run their search
+        await both_searched.wait()
+        return make_text_response(f"{topic} answer")
+
+    mock_anthropic_client.messages.create.side_effect = _create
+    with patch.multiple(
+        "rag_system",
+        VectorStore=MagicMock(return_value=_topic_store()),
+        DocumentProcessor=MagicMock(return_value=SimpleNamespace()),
+        SessionManager=MagicMock(),
+    ):
+        rag = RAGSystem(TEST_CONFIG)
+
+    (answer_a, sources_a), (answer_b, sources_b) = await asyncio.gather(
+        rag.query("Alpha"), rag.query("Beta")
+    )
+
+    assert (answer_a, answer_b) == ("Alpha answer", "Beta answer")
+    assert sources_a == [{"label": "Alpha - Lesson 1", "url": None}]
+    assert sources_b == [{"label": "Beta - Lesson 1", "url": None}]
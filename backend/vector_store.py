@@ -5,6 +5,9 @@ from dataclasses import dataclass
 from models import Course, CourseChunk
 from sentence_transformers import SentenceTransformer
 
+# Stable prefix of the error returned when a course name resolves to nothing
+NO_COURSE_PREFIX = "No course found"
+
 
 @dataclass
 class SearchResults:
@@ -95,7 +98,9 @@ class VectorStore:
         if course_name:
             course_title = self._resolve_course_name(course_name)
             if not course_title:
-                return SearchResults.empty(f"No course found matching '{course_name}'")
+                return SearchResults.empty(
+                    f"{NO_COURSE_PREFIX} matching '{course_name}'"
+                )
 
         # Step 2: Build filter for content search
         filter_dict = self._build_filter(course_title, lesson_number)